@@ -1,12 +1,44 @@
 #!/bin/python
 # -*- coding: utf-8 -*-
 
-import json
-import fire
+import array
+import bisect
+import collections
 import functools
+import importlib.util
+import itertools
 import logging
+import mmap
 import os
-import pprint
+import signal
+import struct
+import sys
+import time
+import zlib
+
+
+# LAZY IMPORTS ################################################################
+def lazyImport(name):
+    # the module is loaded on its first attribute access, so short runs only pay for what they use
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+ast = lazyImport('ast')
+asyncio = lazyImport('asyncio')
+hashlib = lazyImport('hashlib')
+json = lazyImport('json')
+multiprocessing = lazyImport('multiprocessing')
+np = lazyImport('numpy')
+pickle = lazyImport('pickle')
+pprint = lazyImport('pprint')
+shlex = lazyImport('shlex')
 
 
 # LOGGING UTILS ###############################################################
@@ -19,15 +51,20 @@ def initLogging(debug=False):
     globalDebug = debug
     global loggingInitialized
     if not loggingInitialized:
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
         # logFormat = '%(filename)15s:%(lineno)4s %(levelname)6s:%(message)s'
         logFormat = ('[%(asctime)s] [%(levelname)7s] '
                      + '[%(filename)17s:%(lineno)-4s] %(message)s ')
-        logging.basicConfig(
-            filename='logs/puzzles.log',
-            level=logging.DEBUG,
-            format=logFormat)
+        # the log file only for debug runs or when asked for, PUZZLES_LOG_FILE=logs/puzzles.log
+        logFile = os.environ.get('PUZZLES_LOG_FILE', 'logs/puzzles.log' if debug else None)
+        if logFile:
+            if os.path.dirname(logFile) and not os.path.exists(os.path.dirname(logFile)):
+                os.makedirs(os.path.dirname(logFile))
+            logging.basicConfig(
+                filename=logFile,
+                level=logging.DEBUG,
+                format=logFormat)
+        else:
+            logging.getLogger().setLevel(logging.INFO)
 
         # QUETING REQUESTS ###################################################
         logging.getLogger("requests").setLevel(logging.WARNING)
@@ -43,7 +80,8 @@ def initLogging(debug=False):
         logging.getLogger().addHandler(console_handler)
 
         loggingInitialized = True
-        logging.info('')
+        if logFile:
+            logging.info('')
 
 
 # input tools
@@ -53,10 +91,88 @@ def fileLineGenerator(input):
             yield line.strip()
 
 
+class InputCache(object):
+    # parsed inputs keyed by (parser, path, mtime, size), most recently used last
+    entries = None
+
+    def __init__(self, maxEntries=64, cacheDir=None):
+        self.entries = collections.OrderedDict()
+        self.maxEntries = maxEntries
+        self.cacheDir = cacheDir
+
+    def load(self, path, parser):
+        stat = os.stat(path)
+        key = (parser.__name__, os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = self.loadFromDisk(key) if self.cacheDir else None
+        if value is None:
+            value = parser(path)
+            if self.cacheDir:
+                self.saveToDisk(key, value)
+        self.entries[key] = value
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+        return value
+
+    def diskPath(self, key):
+        return os.path.join(self.cacheDir, "%s-%s.pickle" % (key[0], hashlib.sha1(repr(key).encode()).hexdigest()))
+
+    def loadFromDisk(self, key):
+        try:
+            with open(self.diskPath(key), 'rb') as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def saveToDisk(self, key, value):
+        os.makedirs(self.cacheDir, exist_ok=True)
+        temporary = "%s.%s" % (self.diskPath(key), os.getpid())
+        with open(temporary, 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.diskPath(key))
+
+    def clear(self):
+        self.entries.clear()
+
+
+inputCache = InputCache(cacheDir=os.environ.get('PUZZLES_CACHE_DIR', None))
+
+
+def parseIntcodeProgram(programFile):
+    with open(programFile, 'rb') as file:
+        if file.read(len(IntcodeMemory.magic)) == IntcodeMemory.magic:
+            return loadIntcodeImage(programFile)
+    return list(map(int, open(programFile).readline().split(',')))
+
+
+def parseWires(descFile):
+    return list(map(lambda line: line.strip().split(','), open(descFile).readlines()))
+
+
+def parseOrbits(orbitsFile):
+    return list(map(lambda orbitLine: tuple(orbitLine.split(")")), fileLineGenerator(orbitsFile)))
+
+
 def modulesMasses(input='input-data/input-day1-modules-masses.txt'):
     return map(int, fileLineGenerator(input))
 
 
+def modulesMassesChunks(input='input-data/input-day1-modules-masses.txt', chunkSize=1 << 24):
+    # memory-mapped file cut at line ends into chunks of roughly chunkSize bytes
+    with open(input, 'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < len(data):
+                end = data.find(b'\n', start + chunkSize)
+                end = len(data) if end < 0 else end
+                yield np.array(data[start:end].split(), dtype=np.int64)
+                start = end + 1
+
+
 # puzzle functions and classes
 def calcFuelForModuleMass(x):
     x = int(x)
@@ -72,64 +188,321 @@ def calcFuelForModuleAndFuel(x):
     return 0
 
 
+def calcFuelForMasses(masses):
+    return int(np.sum(masses // 3 - 2))
+
+
+def calcFuelForMassesAndFuel(masses):
+    total = 0
+    fuel = masses // 3 - 2
+    while fuel.size:
+        fuel = fuel[fuel > 0]
+        total += int(fuel.sum())
+        fuel = fuel // 3 - 2
+    return total
+
+
+class IntcodeMemory(object):
+    # int64 cells in an array('q') or a memory-mapped image; addresses far past the end and values
+    # not fitting 64 bits live in the sparse dict (their cell holds `spilled`)
+    magic = b'INTCODE1'
+    spilled = -1 << 63
+    maxValue = (1 << 63) - 1
+    growStep = 1024
+
+    def __init__(self, program=(), cells=None):
+        self.sparse = {}
+        if cells is not None:
+            self.cells = cells
+        elif isinstance(program, IntcodeMemory):
+            self.cells = array.array('q')
+            self.cells.frombytes(memoryview(program.cells).cast('B'))
+            self.sparse = dict(program.sparse)
+        else:
+            values = list(program)
+            self.cells = array.array('q')
+            try:
+                self.cells.fromlist(values)
+            except OverflowError:
+                self.cells.fromlist([value if self.spilled < value <= self.maxValue else self.spilled for value in values])
+                self.sparse = {address: value for address, value in enumerate(values)
+                               if not self.spilled < value <= self.maxValue}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.toList())
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            start, stop, stride = address.indices(max(len(self.cells), address.stop or 0))
+            if not self.sparse and stop <= len(self.cells):
+                return self.cells[start:stop:stride].tolist()
+            return [self[i] for i in range(start, stop, stride)]
+        if address < 0:
+            raise IndexError('negative intcode address %s' % address)
+        try:
+            value = self.cells[address]
+        except IndexError:
+            return self.sparse.get(address, 0)
+        return self.sparse[address] if value == self.spilled else value
+
+    def __setitem__(self, address, value):
+        if address < 0:
+            raise IndexError('negative intcode address %s' % address)
+        cells = self.cells
+        if address >= len(cells) and isinstance(cells, array.array) and address < 2 * len(cells) + self.growStep:
+            self.grow(address + 1)
+        if address < len(cells):
+            if self.spilled < value <= self.maxValue:
+                cells[address] = value
+                if self.sparse:
+                    self.sparse.pop(address, None)
+                return
+            cells[address] = self.spilled
+        self.sparse[address] = value
+
+    def __repr__(self):
+        return 'IntcodeMemory(%r)' % self.toList()
+
+    def __getstate__(self):
+        return {'cells': bytes(self.cells), 'sparse': self.sparse}
+
+    def __setstate__(self, state):
+        self.cells = array.array('q')
+        self.cells.frombytes(state['cells'])
+        self.sparse = state['sparse']
+
+    def __array__(self, dtype=None, copy=None):
+        if not self.sparse:
+            return np.array(self.cells, dtype=dtype)
+        return np.array(self.toList(), dtype=dtype)
+
+    def grow(self, size):
+        # dense growth, values spilled past the old end move into the new cells
+        start = len(self.cells)
+        self.cells.frombytes(bytes(8 * (size - start)))
+        for address in [address for address in self.sparse if start <= address < size]:
+            self[address] = self.sparse.pop(address)
+
+    def copy(self):
+        return IntcodeMemory(self)
+
+    def toList(self):
+        values = self.cells.tolist()
+        if self.sparse:
+            values.extend([0] * (max(self.sparse) + 1 - len(values)))
+            for address, value in self.sparse.items():
+                values[address] = value
+        return values
+
+
+def saveIntcodeImage(program, path):
+    # magic, cell count and native int64 cells, then the sparse cells as json
+    memory = program if isinstance(program, IntcodeMemory) else IntcodeMemory(program)
+    with open(path, 'wb') as file:
+        file.write(IntcodeMemory.magic)
+        file.write(array.array('q', [len(memory.cells)]).tobytes())
+        file.write(bytes(memory.cells))
+        file.write(json.dumps({str(address): value for address, value in memory.sparse.items()}).encode())
+
+
+def loadIntcodeImage(path):
+    # zero copy: the cells are a view of a private (copy-on-write) mapping of the file
+    with open(path, 'rb') as file:
+        image = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    if image[:len(IntcodeMemory.magic)] != IntcodeMemory.magic:
+        raise ValueError("%s is not an intcode image" % path)
+    header = len(IntcodeMemory.magic) + 8
+    size = memoryview(image)[header-8:header].cast('q')[0]
+    memory = IntcodeMemory(cells=memoryview(image)[header:header + 8 * size].cast('q'))
+    memory.sparse = {int(address): value for address, value in json.loads(image[header + 8 * size:] or b'{}').items()}
+    return memory
+
+
 class IntcodeComputer(object):
     originalProgram = None
     program = None
     pos = 0
 
-    def __init__(self, programFile='input-data/input-day2-intcode-program.txt'):
-        self.originalProgram = list(map(int, open(programFile).readline().split(',')))
-
-    def findInput(self, result):
-        for noun in range(0, 99):
-            for verb in range(0, 99):
+    def __init__(self, programFile='input-data/input-day2-intcode-program.txt', engine='decoded', tracer=None, memory='list',
+                 profiler=None):
+        self.originalProgram = inputCache.load(programFile, parseIntcodeProgram)
+        self.engine = engine
+        self.profiler = profiler
+        self.memory = memory
+        self.tracer = tracer
+        self.programHash = None
+
+    def newProgram(self):
+        # 'compact' runs on IntcodeMemory, so do programs loaded from intcode images
+        if self.memory == 'compact' and not isinstance(self.originalProgram, IntcodeMemory):
+            return IntcodeMemory(self.originalProgram)
+        return self.originalProgram.copy()
+
+    def newEngine(self, input=None, inputs=None, outputs=None):
+        if self.engine == 'compiled':
+            if not self.programHash:
+                self.programHash = hashlib.sha1(repr(self.originalProgram).encode()).hexdigest()
+            return IntcodeCompiledEngine(self.program, input=input, tracer=self.tracer, programHash=self.programHash,
+                                         inputs=inputs, outputs=outputs)
+        return IntcodeEngine(self.program, input=input, tracer=self.tracer, inputs=inputs, outputs=outputs)
+
+    def findInput(self, result, workers=1, smart=False, lockstep=False, limit=100):
+        if smart:
+            model = self.affineModel(limit)
+            if model:
+                return self.solveAffine(result, model, limit)
+            logging.debug("program output is not affine in noun/verb, scanning")
+        if lockstep:
+            pairs = [(noun, verb) for noun in range(0, limit) for verb in range(0, limit)]
+            for (noun, verb), value in zip(pairs, self.runProgramsLockstep(pairs)):
+                if result == value:
+                    return noun * 100 + verb
+            return None
+        if workers > 1:
+            return self.findInputParallel(result, workers, limit)
+        for noun in range(0, limit):
+            for verb in range(0, limit):
                 if result == self.runProgram(noun, verb):
                     return noun * 100 + verb
         return None
 
+    def findInputParallel(self, result, workers, limit=100):
+        found = multiprocessing.Value('i', limit)
+        with multiprocessing.Pool(workers, initializer=findInputWorkerInit,
+                                  initargs=(self.originalProgram, found)) as pool:
+            rows = pool.imap(findInputRow, [(noun, result, limit) for noun in range(0, limit)])
+            for noun, verb in enumerate(rows):
+                if verb is not None:
+                    pool.terminate()
+                    return noun * 100 + verb
+        return None
+
+    def affineModel(self, limit=100):
+        base = self.runProgram(0, 0)
+        dNoun = self.runProgram(1, 0) - base
+        dVerb = self.runProgram(0, 1) - base
+        probes = [(1, 1), (limit-1, 0), (0, limit-1), (limit-1, limit-1), (limit // 2, limit // 3)]
+        for noun, verb in probes:
+            if self.runProgram(noun, verb) != base + noun * dNoun + verb * dVerb:
+                return None
+        return (base, dNoun, dVerb)
+
+    def solveAffine(self, result, model, limit=100):
+        base, dNoun, dVerb = model
+        for noun in range(0, limit):
+            rest = result - base - noun * dNoun
+            if dVerb == 0:
+                verb = 0 if rest == 0 else None
+            else:
+                verb = rest // dVerb if rest % dVerb == 0 else None
+            if verb is not None and 0 <= verb < limit and result == self.runProgram(noun, verb):
+                return noun * 100 + verb
+        return None
+
     def runProgram(self, noun=None, verb=None):
-        self.program = self.originalProgram.copy()
+        self.program = self.newProgram()
         self.pos = 0
         self.program[1] = noun
         self.program[2] = verb
+        if self.engine != 'classic':
+            self.runEngine(self.newEngine())
+            return self.program[0]
         for command in self.commandGen():
             self.runCommand(command)
         return self.program[0]
 
+    def runEngine(self, engine):
+        return self.profiler.profile(engine) if self.profiler else engine.run()
+
+    def runPrograms(self, inputs):
+        batch = IntcodeBatch(self.originalProgram)
+        for noun, verb in inputs:
+            yield batch.run({1: noun, 2: verb}).get(0, batch.image[0])
+
+    def runTestPrograms(self, system_ids):
+        batch = IntcodeBatch(self.originalProgram)
+        for system_id in system_ids:
+            batch.run({}, input=system_id)
+            yield batch.output
+
+    def runTestProgramsForked(self, system_ids):
+        # runs the program up to its first input once, then every system id continues from there
+        engine = self.startProgram()
+        engine.run()
+        snapshot = engine.snapshot()
+        for system_id in system_ids:
+            fork = snapshot.fork(inputs=itertools.repeat(system_id))
+            fork.run()
+            yield fork.output
+
+    def runProgramsLockstep(self, inputs):
+        inputs = np.array(inputs, dtype=np.int64).reshape(-1, 2)
+        memory, outputs, failed = IntcodeLockstep(self.originalProgram).run(len(inputs), writes={1: inputs[:, 0], 2: inputs[:, 1]})
+        return [None if fail else value for value, fail in zip(memory[0].tolist(), failed)]
+
+    def runTestProgramsLockstep(self, system_ids):
+        memory, outputs, failed = IntcodeLockstep(self.originalProgram).run(len(system_ids), inputs=system_ids)
+        return [None if fail else value for value, fail in zip(outputs.tolist(), failed)]
+
     def runTestProgram(self, system_id=1):
-        self.program = self.originalProgram.copy()
+        self.program = self.newProgram()
+        self.pos = 0
         self.input = system_id
         self.output = 0
+        if self.engine != 'classic':
+            engine = self.newEngine(input=system_id)
+            self.runEngine(engine)
+            self.output = engine.output
+            return self.output
         for command in self.commandGen():
             self.runCommand(command)
         return self.output
 
+    def startProgram(self, inputs=None, outputs=None):
+        # resumable run: call run() again once a waiting engine's streams can move
+        self.program = self.newProgram()
+        return self.newEngine(inputs=IntcodeChannel() if inputs is None else inputs,
+                              outputs=IntcodeChannel() if outputs is None else outputs)
+
+    def streamProgram(self, inputs):
+        # yields every output as soon as it is produced, stops on halt or exhausted inputs
+        outputs = IntcodeChannel(capacity=1)
+        engine = self.startProgram(inputs=inputs, outputs=outputs)
+        while True:
+            engine.run()
+            yield from outputs.drain()
+            if engine.waiting != 'output':
+                return
+
     def runCommand(self, command):
-        logging.debug("---- %s" % command)
+        logging.debug("---- %s", command)
         if command.opcode == 1:
-            logging.debug("ADD: %s + %s = %s -> [%s]" % (command.vals[0], command.vals[1], command.vals[0] + command.vals[1], command.pos))
             self.program[command.pos] = command.vals[0] + command.vals[1]
+            logging.debug("ADD: %s + %s = %s -> [%s]", command.vals[0], command.vals[1], self.program[command.pos], command.pos)
         elif command.opcode == 2:
-            logging.debug("MUL: %s * %s = %s -> [%s]" % (command.vals[0], command.vals[1], command.vals[0] * command.vals[1], command.pos))
             self.program[command.pos] = command.vals[0] * command.vals[1]
+            logging.debug("MUL: %s * %s = %s -> [%s]", command.vals[0], command.vals[1], self.program[command.pos], command.pos)
         elif command.opcode == 3:
-            logging.debug("INP: %s -> [%s]" % (self.input, command.pos))
+            logging.debug("INP: %s -> [%s]", self.input, command.pos)
             self.program[command.pos] = self.input
         elif command.opcode == 4:
-            logging.debug("OUT: [%s] -> %s" % (command.pos, command.vals[0]))
+            logging.debug("OUT: [%s] -> %s", command.pos, command.vals[0])
             self.output = command.vals[0]
         elif command.opcode == 5:
-            logging.debug("JIT: %s: => [%s]" % (command.vals[0] != 0, command.vals[1]))
+            logging.debug("JIT: %s: => [%s]", command.vals[0] != 0, command.vals[1])
             self.pos = command.vals[1] if command.vals[0] != 0 else self.pos + len(command)
         elif command.opcode == 6:
-            logging.debug("JIF: %s: => [%s]" % (command.vals[0] == 0, command.vals[1]))
+            logging.debug("JIF: %s: => [%s]", command.vals[0] == 0, command.vals[1])
             self.pos = command.vals[1] if command.vals[0] == 0 else self.pos + len(command)
         elif command.opcode == 7:
-            logging.debug("ZLS: %s: %s -> [%s]" % (command.vals[0] < command.vals[1], 1, command.pos))
             self.program[command.pos] = 1 if command.vals[0] < command.vals[1] else 0
+            logging.debug("ZLS: %s: %s -> [%s]", command.vals[0] < command.vals[1], 1, command.pos)
         elif command.opcode == 8:
-            logging.debug("ZEQ: %s: %s -> [%s]" % (command.vals[0] == command.vals[1], 1, command.pos))
             self.program[command.pos] = 1 if command.vals[0] == command.vals[1] else 0
+            logging.debug("ZEQ: %s: %s -> [%s]", command.vals[0] == command.vals[1], 1, command.pos)
         else:
             return False
 
@@ -149,6 +522,32 @@ class IntcodeComputer(object):
             return 1
 
 
+# parallel noun/verb search workers
+findInputProgram = None
+findInputFound = None
+
+
+def findInputWorkerInit(program, found):
+    global findInputProgram, findInputFound
+    findInputProgram = program
+    findInputFound = found
+
+
+def findInputRow(args):
+    noun, result, limit = args
+    for verb in range(0, limit):
+        if findInputFound.value < noun:
+            return None
+        program = findInputProgram.copy()
+        program[1] = noun
+        program[2] = verb
+        if result == IntcodeEngine(program).run()[0]:
+            with findInputFound.get_lock():
+                findInputFound.value = min(findInputFound.value, noun)
+            return verb
+    return None
+
+
 class IntcodeCommand(object):
     def __init__(self, command=None, start_index=0):
         if not command:
@@ -182,6 +581,986 @@ class IntcodeCommand(object):
         return "%s - opcode: %s, params: %s -> args: %s -> vals: %s => pos: %s" % (self.command, self.opcode, self.params, self.args, self.vals, self.pos)
 
 
+class IntcodeChannel(object):
+    # FIFO between a program and its producers/consumers, get() returns None when empty,
+    # put() returns False when a bounded channel is full
+    def __init__(self, values=(), capacity=None):
+        self.buffer = collections.deque(values)
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def get(self):
+        return self.buffer.popleft() if self.buffer else None
+
+    def put(self, value):
+        if self.capacity is not None and len(self.buffer) >= self.capacity:
+            return False
+        self.buffer.append(value)
+        return True
+
+    def drain(self):
+        values = list(self.buffer)
+        self.buffer.clear()
+        return values
+
+
+class IntcodeIteratorChannel(object):
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+
+    def get(self):
+        return next(self.iterator, None)
+
+
+class IntcodeCallbackChannel(object):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def put(self, value):
+        self.callback(value)
+        return True
+
+
+class IntcodeQueueChannel(object):
+    # non-blocking side of an asyncio.Queue, the awaiting is left to the caller
+    def __init__(self, queue):
+        self.queue = queue
+
+    def get(self):
+        try:
+            return self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def put(self, value):
+        try:
+            self.queue.put_nowait(value)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+
+class IntcodeFileChannel(object):
+    # values separated by commas or new lines, a reader picks up values appended later
+    def __init__(self, path, mode='r'):
+        self.file = open(path, mode)
+        self.pending = collections.deque()
+
+    def get(self):
+        while not self.pending:
+            line = self.file.readline()
+            if not line:
+                return None
+            self.pending.extend(int(value) for value in line.replace(',', ' ').split())
+        return self.pending.popleft()
+
+    def put(self, value):
+        self.file.write('%s\n' % value)
+        self.file.flush()
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+def intcodeChannel(stream):
+    if stream is None or isinstance(stream, (IntcodeChannel, IntcodeFileChannel, IntcodeIteratorChannel,
+                                             IntcodeCallbackChannel, IntcodeQueueChannel)):
+        return stream
+    if callable(stream):
+        return IntcodeCallbackChannel(stream)
+    if hasattr(stream, '__iter__'):
+        return IntcodeIteratorChannel(stream)
+    if isinstance(stream, asyncio.Queue):
+        return IntcodeQueueChannel(stream)
+    return stream
+
+
+class IntcodeEngine(object):
+    # decoded instruction: (opcode, a, aImm, b, bImm, c, size)
+    sizes = {1: 4, 2: 4, 3: 2, 4: 2, 5: 3, 6: 3, 7: 4, 8: 4}
+
+    def __init__(self, program, input=None, tracer=None, inputs=None, outputs=None):
+        self.memory = program
+        self.pos = 0
+        self.input = input
+        self.output = 0
+        # streams replace the single input value, run() suspends with waiting = 'input'/'output'
+        self.inputs = intcodeChannel(inputs)
+        self.outputs = intcodeChannel(outputs)
+        self.waiting = None
+        self.halted = False
+        self.tracer = tracer
+        self.decoded = [None] * len(program)
+        self.covered = bytearray(len(program))
+
+    def decode(self, pos):
+        instruction = self.decodeInstruction(pos)
+        self.decoded[pos] = instruction
+        for i in range(pos, min(pos+instruction[6], len(self.covered))):
+            self.covered[i] += 1
+        return instruction
+
+    def decodeInstruction(self, pos, memory=None):
+        memory = self.memory if memory is None else memory
+        value = memory[pos]
+        opcode = value % 100
+        size = self.sizes.get(opcode, 1)
+        modes = value // 100 if value >= 0 else -(-value // 100)  # same truncation as IntcodeCommand
+        args = [0, 0, 0]
+        for i in range(0, size-1):
+            args[i] = memory[pos+1+i]
+        return (opcode if size > 1 else 99,
+                args[0], modes % 10 != 0,
+                args[1], modes // 10 % 10 != 0,
+                args[2] if size == 4 else args[0], size)
+
+    def grow(self, size):
+        if size > len(self.decoded):
+            self.decoded.extend([None] * (size - len(self.decoded)))
+            self.covered.extend(bytes(size - len(self.covered)))
+
+    def invalidate(self, address):
+        decoded = self.decoded
+        for start in range(max(0, address-3), address+1):
+            instruction = decoded[start]
+            if instruction and start + instruction[6] > address:
+                decoded[start] = None
+                for i in range(start, min(start+instruction[6], len(self.covered))):
+                    self.covered[i] -= 1
+
+    def run(self):
+        if self.tracer:
+            return self.runTraced()
+        memory = self.memory
+        decoded = self.decoded
+        covered = self.covered
+        if isinstance(memory, IntcodeMemory):
+            if memory.sparse:
+                return self.runTraced()
+            # plain int64 cells until the image bounds or 64 bits are exceeded
+            memory = memory.cells
+            self.grow(len(memory))
+        decode = self.decode
+        inputs = self.inputs
+        outputs = self.outputs
+        pos = self.pos
+        self.waiting = None
+        try:
+            while True:
+                instruction = decoded[pos] or decode(pos)
+                opcode, a, aImm, b, bImm, c, size = instruction
+                if opcode == 1:
+                    memory[c] = (a if aImm else memory[a]) + (b if bImm else memory[b])
+                elif opcode == 2:
+                    memory[c] = (a if aImm else memory[a]) * (b if bImm else memory[b])
+                elif opcode == 7:
+                    memory[c] = 1 if (a if aImm else memory[a]) < (b if bImm else memory[b]) else 0
+                elif opcode == 8:
+                    memory[c] = 1 if (a if aImm else memory[a]) == (b if bImm else memory[b]) else 0
+                elif opcode == 5:
+                    if (a if aImm else memory[a]) != 0:
+                        pos = b if bImm else memory[b]
+                        continue
+                    pos += 3
+                    continue
+                elif opcode == 6:
+                    if (a if aImm else memory[a]) == 0:
+                        pos = b if bImm else memory[b]
+                        continue
+                    pos += 3
+                    continue
+                elif opcode == 3:
+                    if inputs is None:
+                        memory[c] = self.input
+                    else:
+                        value = inputs.get()
+                        if value is None:
+                            self.pos = pos
+                            self.waiting = 'input'
+                            return self.memory
+                        try:
+                            memory[c] = value
+                        except (IndexError, OverflowError):
+                            self.memory[c] = value
+                            self.pos = pos + size
+                            if c < len(covered) and covered[c]:
+                                self.invalidate(c)
+                            return self.runTraced()
+                elif opcode == 4:
+                    value = a if aImm else memory[a]
+                    if outputs is not None and not outputs.put(value):
+                        self.pos = pos
+                        self.waiting = 'output'
+                        return self.memory
+                    self.output = value
+                    pos += 2
+                    continue
+                else:
+                    self.pos = pos
+                    self.halted = True
+                    return self.memory
+                if covered[c]:
+                    self.invalidate(c)
+                pos += size
+        except (IndexError, OverflowError):
+            if memory is self.memory:
+                raise
+            self.pos = pos
+            return self.runTraced()
+
+    def runTraced(self):
+        while self.step():
+            pass
+        return self.memory
+
+    def snapshot(self):
+        return IntcodeSnapshot(self)
+
+    def restore(self, snapshot, inputs=None, outputs=None):
+        if snapshot.sparse is None and isinstance(self.memory, list):
+            self.memory[:] = snapshot.image
+        else:
+            self.memory = snapshot.newMemory()
+        self.pos = snapshot.pos
+        self.input = snapshot.input
+        self.output = snapshot.output
+        self.waiting = snapshot.waiting
+        self.halted = snapshot.halted
+        self.decoded = list(snapshot.decoded)
+        self.covered = bytearray(snapshot.covered)
+        self.inputs = snapshot.newChannel(snapshot.inputs) if inputs is None else intcodeChannel(inputs)
+        self.outputs = snapshot.newChannel(snapshot.outputs) if outputs is None else intcodeChannel(outputs)
+
+    def step(self):
+        # returns False once the program halts or waits for its streams
+        memory = self.memory
+        pos = self.pos
+        self.waiting = None
+        if pos < len(self.decoded):
+            instruction = self.decoded[pos] or self.decode(pos)
+        else:
+            instruction = self.decodeInstruction(pos)
+        if self.tracer:
+            self.tracer.instruction(self, pos, instruction)
+        opcode, a, aImm, b, bImm, c, size = instruction
+        if opcode in [1, 2, 7, 8]:
+            x = a if aImm else memory[a]
+            y = b if bImm else memory[b]
+            if opcode == 1:
+                memory[c] = x + y
+            elif opcode == 2:
+                memory[c] = x * y
+            elif opcode == 7:
+                memory[c] = 1 if x < y else 0
+            else:
+                memory[c] = 1 if x == y else 0
+        elif opcode in [5, 6]:
+            x = a if aImm else memory[a]
+            if (x != 0) == (opcode == 5):
+                self.pos = b if bImm else memory[b]
+                return True
+        elif opcode == 3:
+            value = self.input if self.inputs is None else self.inputs.get()
+            if value is None and self.inputs is not None:
+                self.waiting = 'input'
+                return False
+            memory[c] = value
+        elif opcode == 4:
+            value = a if aImm else memory[a]
+            if self.outputs is not None and not self.outputs.put(value):
+                self.waiting = 'output'
+                return False
+            self.output = value
+            self.pos = pos + size
+            return True
+        else:
+            self.halted = True
+            return False
+        if opcode != 5 and opcode != 6 and c < len(self.covered) and self.covered[c]:
+            self.invalidate(c)
+        self.pos = pos + size
+        return True
+
+
+class IntcodeSnapshot(object):
+    # frozen engine state: the memory image and the decoded instructions are immutable and shared by
+    # every fork, which only makes a flat copy of the image; buffered IntcodeChannels are kept,
+    # other streams have to be passed again to fork()/restore()
+    def __init__(self, engine):
+        memory = engine.memory
+        if isinstance(memory, IntcodeMemory):
+            self.image = bytes(memory.cells)
+            self.sparse = dict(memory.sparse)
+        else:
+            self.image = tuple(memory)
+            self.sparse = None
+        self.decoded = tuple(engine.decoded)
+        self.covered = bytes(engine.covered)
+        self.pos = engine.pos
+        self.input = engine.input
+        self.output = engine.output
+        self.waiting = engine.waiting
+        self.halted = engine.halted
+        self.inputs = self.channelState(engine.inputs)
+        self.outputs = self.channelState(engine.outputs)
+        self.engineClass = engine.__class__
+        self.programHash = getattr(engine, 'programHash', None)
+        self.tracer = engine.tracer
+
+    def channelState(self, channel):
+        return (tuple(channel.buffer), channel.capacity) if isinstance(channel, IntcodeChannel) else None
+
+    def newChannel(self, state):
+        return None if state is None else IntcodeChannel(*state)
+
+    def newMemory(self):
+        if self.sparse is None:
+            return list(self.image)
+        cells = array.array('q')
+        cells.frombytes(self.image)
+        memory = IntcodeMemory(cells=cells)
+        memory.sparse = dict(self.sparse)
+        return memory
+
+    def fork(self, inputs=None, outputs=None):
+        if self.programHash:
+            engine = self.engineClass([], tracer=self.tracer, programHash=self.programHash)
+        else:
+            engine = self.engineClass([], tracer=self.tracer)
+        engine.restore(self, inputs=inputs, outputs=outputs)
+        return engine
+
+
+class IntcodeNode(object):
+    # one computer of an IntcodeNetwork, its input queue is created on the running loop
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.targets = []
+        self.queue = None
+        self.state = 'running'
+        self.blocked = None
+        self.results = []
+        self.last = None
+        self.consumed = 0
+        self.produced = 0
+        self.seconds = 0.0
+
+
+class IntcodeNetwork(object):
+    # runs computers side by side on one asyncio loop, every output is sent to the inputs of the
+    # connected nodes; a node yields after each slice of at most `quantum` outputs and waits on full
+    # (`capacity`) or empty queues
+    def __init__(self, capacity=None, quantum=64):
+        self.nodes = {}
+        self.capacity = capacity
+        self.quantum = quantum
+        self.tasks = []
+        self.deadlocked = False
+        self.seconds = 0.0
+
+    def addNode(self, name, computer, inputs=()):
+        engine = computer.startProgram(inputs=IntcodeChannel(inputs), outputs=IntcodeChannel(capacity=self.quantum))
+        self.nodes[name] = IntcodeNode(name, engine)
+        return self.nodes[name]
+
+    def connect(self, source, *targets):
+        self.nodes[source].targets.extend(self.nodes[target] for target in targets)
+
+    def chain(self, names, loop=False):
+        for source, target in zip(names, names[1:] + names[:1] if loop else names[1:]):
+            self.connect(source, target)
+
+    def broadcast(self, source, targets):
+        self.connect(source, *targets)
+
+    def run(self):
+        return asyncio.run(self.runAsync())
+
+    async def runAsync(self):
+        for node in self.nodes.values():
+            node.queue = asyncio.Queue(self.capacity or 0)
+        start = time.perf_counter()
+        self.tasks = [asyncio.ensure_future(self.runNode(node)) for node in self.nodes.values()]
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.seconds = time.perf_counter() - start
+        return self.report()
+
+    async def runNode(self, node):
+        engine = node.engine
+        while True:
+            start = time.perf_counter()
+            engine.run()
+            node.seconds += time.perf_counter() - start
+            for value in engine.outputs.drain():
+                node.produced += 1
+                node.last = value
+                if not node.targets:
+                    node.results.append(value)
+                for target in node.targets:
+                    if target.state == 'halted':
+                        continue
+                    node.state, node.blocked = 'output', target
+                    if target.queue.full():
+                        self.checkDeadlock()
+                    await target.queue.put(value)
+                node.state = 'running'
+            if engine.halted:
+                node.state = 'halted'
+                while not node.queue.empty():
+                    node.queue.get_nowait()  # wakes up nodes still sending here
+                self.checkDeadlock()
+                return
+            if engine.waiting == 'input':
+                node.state = 'input'
+                self.checkDeadlock()
+                engine.inputs.put(await node.queue.get())
+                node.state = 'running'
+                node.consumed += 1
+            await asyncio.sleep(0)
+
+    def checkDeadlock(self):
+        alive = [node for node in self.nodes.values() if node.state != 'halted']
+        if alive and all(node.state == 'input' and node.queue.empty()
+                         or node.state == 'output' and node.blocked.queue.full() for node in alive):
+            logging.debug("intcode network deadlocked: %s", ', '.join(node.name for node in alive))
+            self.deadlocked = True
+            for task in self.tasks:
+                task.cancel()
+
+    def report(self):
+        return {node.name: {'state': node.state, 'consumed': node.consumed, 'produced': node.produced, 'last': node.last,
+                            'seconds': node.seconds, 'throughput': node.produced / node.seconds if node.seconds else None}
+                for node in self.nodes.values()}
+
+
+class IntcodeOverlay(object):
+    # copy-on-write view: cells written by one run on top of a shared program image
+    def __init__(self, image, writes):
+        self.image = image
+        self.writes = writes
+
+    def __getitem__(self, address):
+        return self.writes[address] if address in self.writes else self.image[address]
+
+    def __len__(self):
+        return len(self.image)
+
+    def toList(self):
+        memory = list(self.image)
+        for address, value in self.writes.items():
+            memory[address] = value
+        return memory
+
+
+class IntcodeBatch(object):
+    # many runs against one immutable image, each run only records the cells it writes
+    image = None
+    decoder = None
+    output = None
+
+    def __init__(self, program):
+        self.image = tuple(program)
+        self.decoder = IntcodeEngine(list(program))  # decodes from the image only, its tables are shared by all runs
+
+    def run(self, writes, input=None):
+        image = self.image
+        decoder = self.decoder
+        decoded = decoder.decoded
+        dirty = set()  # instruction starts that may cover a written cell
+        for address in writes:
+            dirty.update((address-3, address-2, address-1, address))
+        self.output = 0
+        pos = 0
+        while True:
+            if pos in dirty:
+                instruction = decoder.decodeInstruction(pos, IntcodeOverlay(image, writes))
+            else:
+                instruction = decoded[pos] or decoder.decode(pos)
+            opcode, a, aImm, b, bImm, c, size = instruction
+            if opcode in [1, 2, 7, 8]:
+                x = a if aImm else writes[a] if a in writes else image[a]
+                y = b if bImm else writes[b] if b in writes else image[b]
+                if opcode == 1:
+                    value = x + y
+                elif opcode == 2:
+                    value = x * y
+                elif opcode == 7:
+                    value = 1 if x < y else 0
+                else:
+                    value = 1 if x == y else 0
+            elif opcode == 5 or opcode == 6:
+                x = a if aImm else writes[a] if a in writes else image[a]
+                if (x != 0) == (opcode == 5):
+                    pos = b if bImm else writes[b] if b in writes else image[b]
+                else:
+                    pos += 3
+                continue
+            elif opcode == 3:
+                value = input
+            elif opcode == 4:
+                self.output = a if aImm else writes[a] if a in writes else image[a]
+                pos += 2
+                continue
+            else:
+                return writes
+            if c not in writes:
+                image[c]  # same IndexError as writing past the end of a list
+                dirty.update((c-3, c-2, c-1, c))
+            writes[c] = value
+            pos += size
+
+
+class IntcodeLockstep(object):
+    # one numpy column per run; runs at the same pos with the same opcode step together as a group,
+    # parameters (and so addresses) may differ per run, groups only split when jumps diverge
+    # values must fit in int64
+    image = None
+
+    def __init__(self, program):
+        self.image = np.array(program, dtype=np.int64)
+        self.decoder = IntcodeEngine(list(program))
+
+    def run(self, lanes, writes=None, inputs=None):
+        memory = np.repeat(self.image[:, None], lanes, axis=1)
+        for address, values in (writes or {}).items():
+            memory[address] = values
+        inputs = np.zeros(lanes, dtype=np.int64) if inputs is None else np.asarray(inputs, dtype=np.int64)
+        outputs = np.zeros(lanes, dtype=np.int64)
+        failed = np.zeros(lanes, dtype=bool)
+        groups = {0: np.arange(lanes)}
+        while groups:
+            pos = min(groups)
+            members = groups.pop(pos)
+            if not -len(memory) <= pos < len(memory):
+                failed[members] = True
+                continue
+            opcodes = memory[pos, members]
+            values = [opcodes[0]] if (opcodes == opcodes[0]).all() else np.unique(opcodes)
+            for value in values:
+                group = members if len(values) == 1 else members[opcodes == value]
+                instruction = self.decoder.decodeInstruction(0, [int(value), 0, 0, 0])
+                for nextPos, nextGroup in self.execute(memory, inputs, outputs, failed, pos, instruction, group):
+                    if nextPos in groups:
+                        nextGroup = np.sort(np.concatenate((groups[nextPos], nextGroup)))
+                    groups[nextPos] = nextGroup
+        return memory, outputs, failed
+
+    def execute(self, memory, inputs, outputs, failed, pos, instruction, members):
+        opcode, _, aImm, _, bImm, _, size = instruction
+        if opcode == 99:
+            return []
+        if pos + size > len(memory):
+            failed[members] = True
+            return []
+        # a group holding every run in order is addressed with slices instead of fancy indexing
+        lanes = slice(None) if len(members) == memory.shape[1] else members
+        params = [self.uniform(param) for param in memory[pos+1:pos+size, lanes]]
+        # position mode addresses outside of memory fail their runs, like an IndexError in the scalar engines
+        # (jump targets are only checked for the runs taking the jump)
+        addresses = [] if aImm or opcode == 3 else [params[0]]
+        if opcode in [1, 2, 7, 8]:
+            addresses.extend(([] if bImm else [params[1]]) + [params[2]])
+        elif opcode == 3:
+            addresses.append(params[0])
+        bad = np.zeros(len(members), dtype=bool)
+        for address in addresses:
+            bad |= (address >= len(memory)) | (address < -len(memory))
+        if bad.any():
+            failed[members[bad]] = True
+            if bad.all():
+                return []
+            keep = ~bad
+            members, lanes = members[keep], members[keep]
+            params = [param if isinstance(param, int) else param[keep] for param in params]
+        x = params[0] if aImm else self.read(memory, params[0], lanes, members)
+        if opcode in [1, 2, 7, 8]:
+            y = params[1] if bImm else self.read(memory, params[1], lanes, members)
+            if opcode == 1:
+                value = x + y
+            elif opcode == 2:
+                value = x * y
+            elif opcode == 7:
+                value = x < y
+            else:
+                value = x == y
+            self.write(memory, params[2], lanes, members, value)
+        elif opcode == 3:
+            self.write(memory, params[0], lanes, members, inputs[lanes])
+        elif opcode == 4:
+            outputs[lanes] = x
+        else:
+            taken = np.broadcast_to((x != 0) if opcode == 5 else (x == 0), members.shape)
+            target = np.broadcast_to(params[1], members.shape)
+            if not bImm:
+                outside = (target >= len(memory)) | (target < -len(memory))
+                target = memory[np.where(outside, 0, target), members]
+                if (taken & outside).any():
+                    failed[members[taken & outside]] = True
+                    keep = ~(taken & outside)
+                    members, taken, target = members[keep], taken[keep], target[keep]
+            targets = np.where(taken, target, pos + size)
+            if not len(targets):
+                return []
+            if (targets == targets[0]).all():
+                return [(int(targets[0]), members)]
+            return [(int(nextPos), members[targets == nextPos]) for nextPos in np.unique(targets)]
+        return [(pos + size, members)]
+
+    def uniform(self, values):
+        return int(values[0]) if (values == values[0]).all() else values
+
+    def read(self, memory, address, lanes, members):
+        return memory[address, lanes] if isinstance(address, int) else memory[address, members]
+
+    def write(self, memory, address, lanes, members, value):
+        if isinstance(address, int):
+            memory[address, lanes] = value
+        else:
+            memory[address, members] = value
+
+
+class IntcodeBlock(object):
+    # straight-line code compiled into a python function returning the next pos (None on halt)
+    def __init__(self, start, end, writes, source):
+        self.start = start
+        self.end = end
+        self.writes = writes
+        self.source = source
+        self.code = None
+        self.function = None
+        self.limit = 0  # highest address read or written + 1
+        self.positions = {}  # source line -> instruction pos
+
+
+class IntcodeCompiledEngine(IntcodeEngine):
+    blockCache = {}  # (program hash, start) -> [IntcodeBlock], shared by all engines
+    blockMisses = {}  # (program hash, start) -> compilations of yet another variant
+    maxVariants = 4
+    maxMisses = 16
+    maxRecompiles = 8
+    maxInstructions = 256
+
+    def __init__(self, program, input=None, tracer=None, programHash=None, inputs=None, outputs=None):
+        super().__init__(program, input=input, tracer=tracer, inputs=inputs, outputs=outputs)
+        self.programHash = programHash or hashlib.sha1(repr(program).encode()).hexdigest()
+        self.blocks = {}
+        self.codeMap = {}
+        self.recompiles = {}
+        self.stepped = False
+
+    def run(self):
+        if self.tracer:
+            return self.runTraced()
+        memory = self.memory
+        blocks = self.blocks
+        codeMap = self.codeMap
+        covered = self.covered
+        # blocks run on the plain int64 cells of an IntcodeMemory until a value spills out of them
+        cells = memory.cells if isinstance(memory, IntcodeMemory) and not memory.sparse else None
+        pos = self.pos
+        self.waiting = None
+        while True:
+            block = blocks.get(pos)
+            if block is None:
+                block = self.block(pos)
+            if not block:
+                # I/O, hot self-modifying code or undecodable instruction: interpret a single step
+                self.pos = pos
+                self.stepped = True
+                opcode, a, aImm, b, bImm, c, size = self.decodeInstruction(pos)
+                if not self.step():
+                    return memory
+                if opcode in [1, 2, 3, 7, 8] and c in codeMap:
+                    self.invalidateBlocks(c)
+                if cells is not None and memory.sparse:
+                    cells = None
+                pos = self.pos
+                continue
+            if cells is None or block.limit > len(cells):
+                pos = block.function(memory, self)
+            else:
+                try:
+                    pos = block.function(cells, self)
+                except OverflowError as error:
+                    # restart from the instruction that failed, its write did not happen
+                    traceback = error.__traceback__
+                    while traceback.tb_next:
+                        traceback = traceback.tb_next
+                    pos = block.positions[traceback.tb_lineno]
+                    cells = None
+                    for address in block.writes:
+                        if address in codeMap:
+                            self.invalidateBlocks(address)
+                    continue
+            for address in block.writes:
+                if address in codeMap:
+                    self.invalidateBlocks(address)
+                if self.stepped and address < len(covered) and covered[address]:
+                    self.invalidate(address)
+            if pos is None:
+                self.pos = block.end - 1
+                self.halted = True
+                return memory
+
+    def block(self, start):
+        if self.recompiles.get(start, 0) > self.maxRecompiles:
+            return None
+        key = (self.programHash, start)
+        variants = self.blockCache.setdefault(key, [])
+        for block in variants:
+            if self.memory[start:block.end] == block.code:
+                break
+        else:
+            if variants:
+                # code patched differently on every run (noun/verb) is cheaper to interpret
+                self.blockMisses[key] = self.blockMisses.get(key, 0) + 1
+                if self.blockMisses[key] > self.maxMisses:
+                    return None
+            block = self.compile(start)
+            if not block:
+                # I/O instruction, remembered until its code changes
+                self.blocks[start] = False
+                self.codeMap.setdefault(start, set()).add(start)
+                return None
+            variants.append(block)
+            del variants[:-self.maxVariants]
+        self.blocks[start] = block
+        for address in range(start, block.end):
+            self.codeMap.setdefault(address, set()).add(start)
+        return block
+
+    def restore(self, snapshot, inputs=None, outputs=None):
+        super().restore(snapshot, inputs=inputs, outputs=outputs)
+        self.blocks = {}
+        self.codeMap = {}
+        self.recompiles = {}
+        self.stepped = any(self.covered)
+
+    def invalidateBlocks(self, address):
+        for start in self.codeMap.pop(address):
+            block = self.blocks.pop(start, None)
+            if block:
+                self.recompiles[start] = self.recompiles.get(start, 0) + 1
+                for other in range(start, block.end):
+                    if other != address:
+                        self.codeMap[other].discard(start)
+
+    def compile(self, start):
+        lines = []
+        writes = []
+        positions = []
+        addresses = [start]
+        pos = start
+        end = None
+        loop = False
+        while end is None and len(lines) < self.maxInstructions:
+            try:
+                opcode, a, aImm, b, bImm, c, size = self.decodeInstruction(pos)
+            except IndexError:
+                break
+            if any(pos <= address < pos + size for address in writes):
+                break  # the block itself rewrites this instruction
+            x = str(a) if aImm else "memory[%s]" % a
+            y = str(b) if bImm else "memory[%s]" % b
+            if opcode == 1:
+                lines.append("memory[%s] = %s + %s" % (c, x, y))
+            elif opcode == 2:
+                lines.append("memory[%s] = %s * %s" % (c, x, y))
+            elif opcode == 7:
+                lines.append("memory[%s] = 1 if %s < %s else 0" % (c, x, y))
+            elif opcode == 8:
+                lines.append("memory[%s] = 1 if %s == %s else 0" % (c, x, y))
+            elif opcode in [3, 4]:
+                break  # may suspend the engine on its streams, left to step()
+            elif opcode in [5, 6]:
+                loop = bImm and b == start and not any(start <= address < pos + size for address in writes)
+                lines.append("if %s %s 0: %s" % (x, '!=' if opcode == 5 else '==', 'continue' if loop else 'return %s' % y))
+                end = pos + size
+            else:
+                lines.append("return None")
+                end = pos + size
+            if opcode in [1, 2, 7, 8]:
+                writes.append(c)
+            positions.append(pos)
+            addresses.extend([pos + size - 1] + [address for address, immediate in [(a, aImm), (b, bImm), (c, False)] if not immediate][:size-1])
+            pos += size
+        if not lines:
+            return None
+        end = pos if end is None else end
+        if lines[-1] != "return None":
+            lines.append("return %s" % end)
+        if loop:
+            # the block jumps back to its own start and never rewrites itself, so it can spin in place
+            lines = ["while True:"] + ["    " + line for line in lines]
+        source = "def block(memory, engine):\n    " + "\n    ".join(lines) + "\n"
+        block = IntcodeBlock(start, end, writes, source)
+        block.limit = max(addresses) + 1
+        block.positions = {i + (3 if loop else 2): pos for i, pos in enumerate(positions)}
+        namespace = {}
+        exec(compile(source, "<intcode block %s>" % start, 'exec'), namespace)
+        block.function = namespace['block']
+        block.code = self.memory[start:end]
+        return block
+
+
+class IntcodeTracer(object):
+    mnemonics = {1: 'ADD', 2: 'MUL', 3: 'INP', 4: 'OUT', 5: 'JIT', 6: 'JIF', 7: 'ZLS', 8: 'ZEQ', 99: 'HLT'}
+
+    def __init__(self, size=32, hook=None, log=True):
+        self.histogram = {}
+        self.last = collections.deque(maxlen=size)
+        self.hook = hook
+        self.log = log
+
+    def instruction(self, engine, pos, instruction):
+        opcode = instruction[0]
+        self.histogram[opcode] = self.histogram.get(opcode, 0) + 1
+        self.last.append((pos, instruction))
+        if self.log:
+            logging.debug("%5s: %s %s", pos, self.mnemonics[opcode], engine.memory[pos:pos+instruction[6]])
+        if self.hook:
+            self.hook(engine, pos, instruction)
+
+    def report(self):
+        for opcode, count in sorted(self.histogram.items(), key=lambda item: -item[1]):
+            logging.debug("%s: %s", self.mnemonics[opcode], count)
+        for pos, instruction in self.last:
+            logging.debug("%5s: %s %s", pos, self.mnemonics[instruction[0]], instruction[1:6])
+
+
+class IntcodeProfiler(object):
+    # exact mode: runs the engine interpreted with the profiler as its tracer, counting instructions,
+    # jump edges and wall time of the straight runs between jumps (blocks);
+    # sampling mode (interval in seconds of cpu time): the fast run loops are left alone and a SIGPROF
+    # handler records the address they are at, counts are then samples (python delivers signals at
+    # jumps and calls, so the samples lean towards the ends of blocks)
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.addresses = {}
+        self.opcodes = {}
+        self.edges = {}  # (jump pos, next pos) -> count
+        self.blocks = {}  # block start -> [entries, instructions, seconds]
+        self.code = {}  # pos -> instruction words as first executed, for the disassembly
+        self.samples = 0
+        self.last = None
+        self.block = None
+        self.engine = None
+
+    def profile(self, engine):
+        self.engine = engine
+        if self.interval:
+            previous = signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            try:
+                return engine.run()
+            finally:
+                signal.setitimer(signal.ITIMER_PROF, 0, 0)
+                signal.signal(signal.SIGPROF, previous)
+        tracer = engine.tracer
+        engine.tracer = self
+        try:
+            return engine.run()
+        finally:
+            engine.tracer = tracer
+            self.closeBlock(time.perf_counter())
+            self.last = None
+
+    def instruction(self, engine, pos, instruction):
+        opcode = instruction[0]
+        if pos not in self.addresses:
+            self.code[pos] = engine.memory[pos:pos+instruction[6]]
+        self.addresses[pos] = self.addresses.get(pos, 0) + 1
+        self.opcodes[opcode] = self.opcodes.get(opcode, 0) + 1
+        if self.last is None:
+            self.block = [pos, 0, time.perf_counter()]
+        else:
+            lastPos, lastOpcode, lastEnd = self.last
+            if lastOpcode in [5, 6]:
+                edge = (lastPos, pos)
+                self.edges[edge] = self.edges.get(edge, 0) + 1
+            if lastOpcode in [5, 6] or pos != lastEnd:
+                now = time.perf_counter()
+                self.closeBlock(now)
+                self.block = [pos, 0, now]
+        self.block[1] += 1
+        self.last = (pos, opcode, pos + instruction[6])
+
+    def closeBlock(self, now):
+        if self.block:
+            start, instructions, started = self.block
+            entry = self.blocks.setdefault(start, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += instructions
+            entry[2] += now - started
+            self.block = None
+
+    def sample(self, signum, frame):
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename.startswith('<intcode block'):
+                start = int(code.co_filename[len('<intcode block '):-1])
+                block = self.engine.blocks.get(start)
+                pos = block.positions.get(frame.f_lineno, start) if block else start
+                break
+            if code is IntcodeEngine.run.__code__ or code is IntcodeCompiledEngine.run.__code__ or code is IntcodeEngine.step.__code__:
+                pos = frame.f_locals['pos']
+                break
+            frame = frame.f_back
+        else:
+            return
+        opcode, a, aImm, b, bImm, c, size = self.engine.decodeInstruction(pos)
+        if pos not in self.addresses:
+            self.code[pos] = self.engine.memory[pos:pos+size]
+        self.samples += 1
+        self.addresses[pos] = self.addresses.get(pos, 0) + 1
+        self.opcodes[opcode] = self.opcodes.get(opcode, 0) + 1
+
+    def report(self):
+        mnemonics = IntcodeTracer.mnemonics
+        return {'mode': 'sampling' if self.interval else 'exact',
+                'samples': self.samples,
+                'opcodes': {mnemonics[opcode]: count for opcode, count in sorted(self.opcodes.items())},
+                'addresses': {str(pos): count for pos, count in sorted(self.addresses.items())},
+                'edges': [[source, target, count] for (source, target), count in sorted(self.edges.items())],
+                'blocks': [{'start': start, 'entries': entries, 'instructions': instructions, 'seconds': seconds}
+                           for start, (entries, instructions, seconds) in sorted(self.blocks.items(), key=lambda item: -item[1][2])]}
+
+    def disassembly(self, program):
+        # one line per instruction of the sequential decoding, resynchronized on executed addresses,
+        # with its share of the profile
+        total = sum(self.addresses.values()) or 1
+        executed = sorted(self.addresses)
+        program = list(program)
+        for pos, words in self.code.items():
+            program[pos:pos+len(words)] = words
+        lines = []
+        pos = 0
+        while pos < len(program):
+            count = self.addresses.get(pos, 0)
+            try:
+                command = IntcodeCommand(program, pos)
+                text, size = str(command), len(command)
+            except IndexError:
+                text, size = "%s - data" % program[pos], 1
+            following = bisect.bisect_right(executed, pos)
+            if following < len(executed) and executed[following] < pos + size:
+                text, size = "%s - data" % program[pos:executed[following]], executed[following] - pos
+            lines.append("%5s %9s %6.2f%% %s" % (pos, count, 100.0 * count / total, text))
+            pos += size
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path, program=None):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+        if program is not None:
+            with open(os.path.splitext(path)[0] + '.asm', 'w') as file:
+                file.write(self.disassembly(program))
+
+
 class WireBox(object):
     info = None
     wireNo = None
@@ -190,7 +1569,8 @@ class WireBox(object):
     box = None
 
     def __init__(self, descFile='input-data/input-day3-wires.txt'):
-        self.info = list(map(lambda line: line.strip().split(','), open(descFile).readlines()))
+        self.descFile = descFile
+        self.info = inputCache.load(descFile, parseWires)
         self.wireNo = 0
         self.coord = [0, 0]
         self.steps = 0
@@ -238,26 +1618,23 @@ class WireBox(object):
         wire['steps_total'] = sum([wire.get(x, 0) for x in list(map(lambda x: "steps_wire_%s" % x, range(1, self.wireNo+1)))])
         # logging.info("wire['steps_wire_%s]=%s, total: %s" % (self.wireNo, wire['steps_wire_%s' % self.wireNo], wire['steps_total']))
 
-    def drawBox(self):
-        xs = set(map(lambda tpl: tpl[0], self.box.keys()))
-        ys = set(map(lambda tpl: tpl[1], self.box.keys()))
-        logging.debug("xs: [%s, %s], ys: [%s,%s]" % (min(xs), max(xs), min(ys), max(ys)))
-        boxDrawing = ""
+    def drawBox(self, viewport=None, scale=1, output=None, tileRows=64):
+        # viewport: (xmin, ymin, xmax, ymax) cells, output: .txt, .pgm or .png file instead of the log
+        segments = self.segmentBox()
+        renderer = WireRenderer(segments.segments, segments.crossings, viewport=viewport, scale=scale, tileRows=tileRows)
+        if output:
+            renderer.save(output)
+            return
         logging.info("===============")
-        for y in range(max(ys), min(ys)-1, -1):
-            for x in range(min(xs), max(xs)+1, 1):
-                type = '.'
-                wire = self.box.get((x, y), None)
-                if x == 0 and y == 0:
-                    type = 'o'
-                elif wire:
-                    type = wire['type']
-                # logging.info("drawing (%s,%s) -> %s" % (x,y,type))
-                boxDrawing += type
-            logging.info(boxDrawing)
-            boxDrawing = ""
+        for row in renderer.rows():
+            logging.info(row)
         logging.info("===============")
 
+    def segmentBox(self):
+        box = SegmentWireBox(descFile=self.descFile)
+        box.construct()
+        return box
+
     def distanceToClosestCrossing(self):
         logging.info("determining crossings...")
         crossings = dict(filter(lambda elem: elem[1]['type'] == 'X', self.box.items()))
@@ -271,31 +1648,356 @@ class WireBox(object):
         return min(map(lambda crossing: crossing[1]['steps_total'], crossings.items()))
 
 
+class SegmentWireBox(WireBox):
+    # segment: (wireNo, axis, line, lo, hi, start, steps) - axis 0: along x at y=line, 1: along y at x=line
+    segments = None
+    lines = None
+    crossings = None
+
+    def construct(self):
+        self.segments = []
+        self.lines = [{}, {}]
+        super().construct()
+        self.findCrossings()
+
+    def constructPath(self, path):
+        axis = 0 if path[0] in ['R', 'L'] else 1  # 0->x, 1->y
+        sign = 1 if path[0] in ['U', 'R'] else -1
+        length = int(path[1:])
+        start = self.coord[axis]
+        self.coord[axis] += length * sign
+        if length:
+            # the segment covers the cells it enters, its start cell belongs to the previous one
+            segment = (self.wireNo, axis, self.coord[1-axis],
+                       min(start+sign, self.coord[axis]), max(start+sign, self.coord[axis]), start, self.steps)
+            self.segments.append(segment)
+            self.lines[axis].setdefault(segment[2], []).append(segment)
+        self.steps += length
+
+    def findCrossings(self):
+        logging.info("determining crossings...")
+        candidates = self.perpendicularCrossings()
+        candidates.update(self.collinearCrossings(candidates))
+        self.crossings = {}
+        for point in candidates:
+            touching = self.touching(point)
+            if len(touching) > 1:
+                self.crossings[point] = sum(touching.values())
+
+    def perpendicularCrossings(self):
+        # sweep along x: horizontal segments are active between their ends, vertical ones query their y range
+        events = []
+        for i, segment in enumerate(self.segments):
+            if segment[1] == 0:
+                events.append((segment[3], 0, i))
+                events.append((segment[4], 2, i))
+            else:
+                events.append((segment[2], 1, i))
+        events.sort()
+        active = []
+        points = set()
+        for x, event, i in events:
+            segment = self.segments[i]
+            if event == 0:
+                bisect.insort(active, (segment[2], i))
+            elif event == 2:
+                del active[bisect.bisect_left(active, (segment[2], i))]
+            else:
+                first = bisect.bisect_left(active, (segment[3], -1))
+                last = bisect.bisect_right(active, (segment[4], len(self.segments)))
+                for y, j in active[first:last]:
+                    if self.segments[j][0] != segment[0]:
+                        points.add((x, y))
+        return points
+
+    def collinearCrossings(self, perpendicular):
+        # steps along an overlap are concave between the points where a touching segment starts or ends,
+        # so the overlap ends, those breakpoints and the point closest to the origin are enough
+        points = set()
+        for axis in [0, 1]:
+            crossed = {}
+            for point in perpendicular:
+                crossed.setdefault(point[1-axis], []).append(point[axis])
+            for line, segments in self.lines[axis].items():
+                breakpoints = set(crossed.get(line, []))
+                for segment in segments:
+                    breakpoints.update([segment[3], segment[4]])
+                breakpoints = sorted(set(t + d for t in breakpoints for d in [-1, 0, 1]))
+                active = []
+                for segment in sorted(segments, key=lambda s: s[3]):
+                    active = [a for a in active if a[4] >= segment[3]]
+                    for other in active:
+                        if other[0] == segment[0]:
+                            continue
+                        lo, hi = segment[3], min(segment[4], other[4])
+                        inside = breakpoints[bisect.bisect_left(breakpoints, lo):bisect.bisect_right(breakpoints, hi)]
+                        for t in set(inside + [lo, hi, min(max(0, lo), hi)]):
+                            points.add((t, line) if axis == 0 else (line, t))
+                    active.append(segment)
+        return points
+
+    def touching(self, point):
+        wires = {}
+        for axis in [0, 1]:
+            t = point[axis]
+            for segment in self.lines[axis].get(point[1-axis], []):
+                if segment[3] <= t <= segment[4]:
+                    steps = segment[6] + abs(t - segment[5])
+                    if steps < wires.get(segment[0], steps+1):
+                        wires[segment[0]] = steps
+        return wires
+
+    def segmentBox(self):
+        return self if self.segments is not None else super().segmentBox()
+
+    def distanceToClosestCrossing(self):
+        return min(map(lambda coord: abs(coord[0])+abs(coord[1]), self.crossings))
+
+    def minStepsToCrossing(self):
+        return min(self.crossings.values())
+
+
+class NumpyWireBox(WireBox):
+    # cells are packed into int64 keys: (x + offset) << 32 | (y + offset)
+    offset = 1 << 30
+    directions = {'R': (1, 0), 'L': (-1, 0), 'U': (0, 1), 'D': (0, -1)}
+    wires = None
+    crossings = None
+    totals = None
+
+    def construct(self):
+        logging.info("constructing box...")
+        self.wires = [self.rasterizeWire(wire) for wire in self.info]
+        self.findCrossings()
+
+    def rasterizeWire(self, wire):
+        moves = np.array([self.directions[path[0]] for path in wire], dtype=np.int64).reshape(-1, 2)
+        lengths = np.array([int(path[1:]) for path in wire], dtype=np.int64)
+        xs = np.cumsum(np.repeat(moves[:, 0], lengths))
+        ys = np.cumsum(np.repeat(moves[:, 1], lengths))
+        keys = ((xs + self.offset) << 32) | (ys + self.offset)
+        keys, first = np.unique(keys, return_index=True)
+        return keys, first + 1  # first visit of each cell, steps count from 1
+
+    def findCrossings(self):
+        logging.info("determining crossings...")
+        keys = np.concatenate([wire[0] for wire in self.wires])
+        steps = np.concatenate([wire[1] for wire in self.wires])
+        cells, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        totals = np.zeros(len(cells), dtype=np.int64)
+        np.add.at(totals, inverse, steps)
+        self.crossings = cells[counts > 1]
+        self.totals = totals[counts > 1]
+
+    def distanceToClosestCrossing(self):
+        xs = (self.crossings >> 32) - self.offset
+        ys = (self.crossings & 0xffffffff) - self.offset
+        return int(np.min(np.abs(xs) + np.abs(ys)))
+
+    def minStepsToCrossing(self):
+        return int(np.min(self.totals))
+
+
+wireBoxEngines = {'grid': WireBox, 'segments': SegmentWireBox, 'numpy': NumpyWireBox}
+
+
+class WireRenderer(object):
+    # draws wire segments tile by tile (tileRows rows of pixels), memory is bounded by the tile and not by
+    # the box; every pixel covers scale x scale cells and shows the strongest of them: . - | + X o
+    chars = b'.-|+Xo'
+    levels = [0, 96, 96, 160, 255, 255]
+
+    def __init__(self, segments, crossings, viewport=None, scale=1, tileRows=64):
+        # segments as built by SegmentWireBox: (wireNo, axis, line, lo, hi, start, steps)
+        self.segments = segments
+        self.crossings = sorted(crossings)
+        if viewport is None:
+            xs = [0] + [s[3] for s in segments if s[1] == 0] + [s[4] for s in segments if s[1] == 0] + [s[2] for s in segments if s[1] == 1]
+            ys = [0] + [s[3] for s in segments if s[1] == 1] + [s[4] for s in segments if s[1] == 1] + [s[2] for s in segments if s[1] == 0]
+            viewport = (min(xs), min(ys), max(xs), max(ys))
+        self.x0, self.y0, self.x1, self.y1 = viewport
+        self.scale = scale
+        self.tileRows = tileRows
+        self.width = (self.x1 - self.x0) // scale + 1
+        self.height = (self.y1 - self.y0) // scale + 1
+
+    def pixel(self, x, y):
+        return (self.y1 - y) // self.scale, (x - self.x0) // self.scale
+
+    def tiles(self):
+        # yields (first row, uint8 array of tileRows x width priorities)
+        for top in range(0, self.height, self.tileRows):
+            tile = np.zeros((min(self.tileRows, self.height - top), self.width), dtype=np.uint8)
+            bottom = top + len(tile)
+            for wireNo, axis, line, lo, hi, start, steps in self.segments:
+                if axis == 0 and self.y0 <= line <= self.y1:
+                    row = self.pixel(0, line)[0] - top
+                    lo, hi = max(lo, self.x0), min(hi, self.x1)
+                    if 0 <= row < len(tile) and lo <= hi:
+                        cells = tile[row, self.pixel(lo, 0)[1]:self.pixel(hi, 0)[1]+1]
+                        np.maximum(cells, 1, out=cells)
+                elif axis == 1 and self.x0 <= line <= self.x1:
+                    first, last = self.pixel(0, min(hi, self.y1))[0], self.pixel(0, max(lo, self.y0))[0]
+                    first, last = max(first, top), min(last, bottom - 1)
+                    if first <= last:
+                        cells = tile[first-top:last-top+1, self.pixel(line, 0)[1]]
+                        np.maximum(cells, 2, out=cells)
+                end = hi if lo > start else lo
+                self.mark(tile, top, (end, line) if axis == 0 else (line, end), 3)
+            for point in self.crossings:
+                self.mark(tile, top, point, 4)
+            self.mark(tile, top, (0, 0), 5)
+            yield top, tile
+
+    def mark(self, tile, top, point, value):
+        if self.x0 <= point[0] <= self.x1 and self.y0 <= point[1] <= self.y1:
+            row, column = self.pixel(*point)
+            if top <= row < top + len(tile) and tile[row-top, column] < value:
+                tile[row-top, column] = value
+
+    def rows(self):
+        table = bytes.maketrans(bytes(range(len(self.chars))), self.chars)
+        for top, tile in self.tiles():
+            for row in tile:
+                yield row.tobytes().translate(table).decode()
+
+    def save(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        with open(path, 'wb') as file:
+            if extension == '.pgm':
+                self.writePgm(file)
+            elif extension == '.png':
+                self.writePng(file)
+            else:
+                for row in self.rows():
+                    file.write(row.encode() + b'\n')
+
+    def writePgm(self, file):
+        levels = np.array(self.levels, dtype=np.uint8)
+        file.write(b'P5\n%d %d\n255\n' % (self.width, self.height))
+        for top, tile in self.tiles():
+            file.write(levels[tile].tobytes())
+
+    def writePng(self, file):
+        # 8 bit grayscale, every tile is compressed into its own IDAT chunk
+        def chunk(kind, data):
+            file.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+        levels = np.array(self.levels, dtype=np.uint8)
+        file.write(b'\x89PNG\r\n\x1a\n')
+        chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 0, 0, 0, 0))
+        compressor = zlib.compressobj()
+        for top, tile in self.tiles():
+            pixels = np.zeros((len(tile), self.width + 1), dtype=np.uint8)  # filter byte 0 in front of every row
+            pixels[:, 1:] = levels[tile]
+            data = compressor.compress(pixels.tobytes())
+            if data:
+                chunk(b'IDAT', data)
+        chunk(b'IDAT', compressor.flush())
+        chunk(b'IEND', b'')
+
+
 class PasswordBreaker(object):
+    rules1 = ['hasDouble', 'hasNoLoweringNumbers']
+    rules2 = ['hasDouble', 'hasNoLoweringNumbers', 'hasOnlyDoublesRepeating']
+    ruleCosts = {'hasNoLoweringNumbers': 1, 'hasDouble': 2, 'hasOnlyDoublesRepeating': 3}  # unknown rules go last
+
     def __init__(self, start=0, end=999999):
         self.start = start
         self.end = end
+        self.tailsCache = {}
 
     def passwords1(self):
-        for passwd in range(self.start, self.end+1):
+        for passwd in self.nonLoweringPasswords():
             passwdStr = str(passwd)
             if not self.hasDouble(passwdStr):
                 continue
-            if not self.hasNoLoweringNumbers(passwdStr):
-                continue
             yield passwd
 
     def passwords2(self):
-        for passwd in range(self.start, self.end+1):
+        for passwd in self.nonLoweringPasswords():
             passwdStr = str(passwd)
             if not self.hasDouble(passwdStr):
                 continue
-            if not self.hasNoLoweringNumbers(passwdStr):
-                continue
             if not self.hasOnlyDoublesRepeating(passwdStr):
                 continue
             yield passwd
 
+    def nonLoweringPasswords(self):
+        # non-lowering numbers cannot contain 0 (except 0 itself, which has no double anyway)
+        for length in range(len(str(max(self.start, 1))), len(str(self.end))+1):
+            for digits in itertools.combinations_with_replacement('123456789', length):
+                passwd = int(''.join(digits))
+                if passwd > self.end:
+                    return
+                if passwd >= self.start:
+                    yield passwd
+
+    def scan(self, rules=None, workers=1, chunkSize=100000):
+        for matches in self.scanChunks(rules, workers, chunkSize, collect=True):
+            yield from matches
+
+    def scanCount(self, rules=None, workers=1, chunkSize=100000):
+        return sum(self.scanChunks(rules, workers, chunkSize, collect=False))
+
+    def scanChunks(self, rules, workers, chunkSize, collect):
+        rules = sorted(rules or self.rules1, key=lambda rule: self.ruleCosts.get(rule, 4) if isinstance(rule, str) else 4)
+        chunks = [(start, min(start+chunkSize-1, self.end), rules, collect)
+                  for start in range(self.start, self.end+1, chunkSize)]
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                yield from pool.imap(scanPasswords, chunks)
+        else:
+            yield from map(scanPasswords, chunks)
+
+    def countPasswords1(self):
+        return self.countUpTo(self.end, exactDouble=False) - self.countUpTo(self.start-1, exactDouble=False)
+
+    def countPasswords2(self):
+        return self.countUpTo(self.end, exactDouble=True) - self.countUpTo(self.start-1, exactDouble=True)
+
+    def countUpTo(self, bound, exactDouble):
+        if bound < 1:
+            return 0
+        bound = str(bound)
+        counts = [self.countOfLength('9' * length, exactDouble) for length in range(1, len(bound))]
+        return sum(counts) + self.countOfLength(bound, exactDouble)
+
+    def countOfLength(self, upper, exactDouble):
+        # digit DP walking the tight prefix of upper, free suffixes come from the tails table
+        tails = self.tails(len(upper), exactDouble)
+        total = 0
+        state = None
+        for i, digit in enumerate(map(int, upper)):
+            lowest = state[0] if state else 1
+            for d in range(lowest, digit):
+                total += tails[len(upper)-i-1][self.nextState(state, d)]
+            if digit < lowest:
+                return total
+            state = self.nextState(state, digit)
+        return total + tails[0][state]
+
+    def nextState(self, state, digit):
+        # state: (last digit, current run length capped at 3, any run >= 2 so far, any run == 2 so far)
+        if not state:
+            return (digit, 1, False, False)
+        prev, run, double, exact = state
+        if digit == prev:
+            return (digit, min(run+1, 3), double, exact)
+        return (digit, 1, double or run >= 2, exact or run == 2)
+
+    def tails(self, length, exactDouble):
+        tails = self.tailsCache.setdefault(exactDouble, [])
+        states = [(prev, run, double, exact)
+                  for prev in range(1, 10) for run in [1, 2, 3] for double in [False, True] for exact in [False, True]]
+        if not tails:
+            tails.append(dict((state, int((state[3] or state[1] == 2) if exactDouble else (state[2] or state[1] >= 2)))
+                              for state in states))
+        while len(tails) < length:
+            previous = tails[-1]
+            tails.append(dict((state, sum(previous[self.nextState(state, d)] for d in range(state[0], 10)))
+                              for state in states))
+        return tails
+
     def hasDouble(self, passwdStr):
         uniqueDigits = list(set(list(passwdStr)))
         return len(uniqueDigits) < len(passwdStr)
@@ -316,13 +2018,37 @@ class PasswordBreaker(object):
         return any(map(lambda count: count == 2, digitCounts))
 
 
+def scanPasswords(chunk):
+    start, end, rules, collect = chunk
+    breaker = PasswordBreaker(start=start, end=end)
+    checks = [getattr(breaker, rule) if isinstance(rule, str) else rule for rule in rules]
+    matches = []
+    count = 0
+    for passwd in range(start, end+1):
+        passwdStr = str(passwd)
+        for check in checks:
+            if not check(passwdStr):
+                break
+        else:
+            count += 1
+            if collect:
+                matches.append(passwd)
+    return matches if collect else count
+
+
 class PlanetarySystem(object):
     planets = None
+    orbiters = None
+    index = None
+    total = 0
 
     def __init__(self, orbitsFile='input-files/day6-orbits'):
         self.planets = {}
-        for orbitLine in fileLineGenerator(orbitsFile):
-            self.addPlanet(orbitLine.split(")")[1], orbitLine.split(")")[0])
+        self.orbiters = {}
+        self.total = 0
+        for inOrbitOf, name in inputCache.load(orbitsFile, parseOrbits):
+            self.linkPlanet(name, inOrbitOf)
+        self.updateToCOM([name for name, planet in self.planets.items() if planet['inOrbitOf'] not in self.planets])
 
     def planet(self, planet):
         if isinstance(planet, dict):
@@ -331,31 +2057,81 @@ class PlanetarySystem(object):
             return self.planets.get("%s" % planet, None)
 
     def addPlanet(self, name, inOrbitOf):
-        planet = {'name': name, 'inOrbitOf': inOrbitOf}
-        planet['toCOM'] = 1 + self.planets[planet['inOrbitOf']]['toCOM'] if planet['inOrbitOf'] in self.planets else 1
-        self.planets[planet['name']] = planet
-        self.incOrbitersToCOM(planet)
-        
+        # a known name is moved, with its orbiters
+        if inOrbitOf in self.subtree(name):
+            raise ValueError("%s can not orbit %s, it is one of its orbiters" % (name, inOrbitOf))
+        self.linkPlanet(name, inOrbitOf)
+        self.updateToCOM([name])
+
+    def movePlanet(self, name, inOrbitOf):
+        if name not in self.planets:
+            raise KeyError(name)
+        self.addPlanet(name, inOrbitOf)
+
+    def removePlanet(self, name):
+        # orbiters keep orbiting the name, like for a body missing in the orbits file
+        planet = self.planets.pop(name)
+        self.orbiters[planet['inOrbitOf']].discard(name)
+        self.total -= planet['toCOM']
+        if self.index:
+            self.index.remove(name)
+        self.updateToCOM(list(self.orbiters.get(name, ())))
+
+    def linkPlanet(self, name, inOrbitOf):
+        previous = self.planets.get(name, None)
+        if previous:
+            self.orbiters[previous['inOrbitOf']].discard(name)
+        self.planets[name] = {'name': name, 'inOrbitOf': inOrbitOf, 'toCOM': previous['toCOM'] if previous else None}
+        self.orbiters.setdefault(inOrbitOf, set()).add(name)
+
+    def subtree(self, name):
+        names = [name]
+        for name in names:
+            names.extend(self.orbiters.get(name, ()))
+        return names
+
+    def updateToCOM(self, names):
+        # breadth first over the orbiters index, parents are always updated before their orbiters;
+        # the orbit total and a built distance index follow the same planets
+        queue = collections.deque(names)
+        updated = []
+        while queue:
+            planet = self.planets[queue.popleft()]
+            parent = self.planets.get(planet['inOrbitOf'], None)
+            toCOM = 1 + parent['toCOM'] if parent else 1
+            self.total += toCOM - (planet['toCOM'] or 0)
+            planet['toCOM'] = toCOM
+            updated.append(planet['name'])
+            queue.extend(self.orbiters.get(planet['name'], ()))
+        if self.index:
+            self.index.update(self, updated)
+
     def incOrbitersToCOM(self, planet):
-        planet = self.planet(planet)
-        for orbiter in list(filter(lambda o: o['inOrbitOf'] == planet['name'], self.planets.values())):
-            orbiter['toCOM'] = 1 + planet['toCOM']
-            self.incOrbitersToCOM(orbiter)
+        self.updateToCOM(self.orbiters.get(self.planet(planet)['name'], ()))
 
     def countOrbits(self):
-        orbitCount = 0
-        return functools.reduce(lambda toCOM1, toCOM2: toCOM1+toCOM2, list(map(lambda p:p['toCOM'], self.planets.values())))
+        return self.total
 
     def distBetweenOrbiters(self, orbiter1, orbiter2):
         return self.distBetweenPlanets(self.planet(orbiter1)['inOrbitOf'], self.planet(orbiter2)['inOrbitOf'])
 
     def distBetweenPlanets(self, planet1, planet2):
-        return len(self.pathBetweenPlanets(planet1, planet2)) - 1
+        return self.distsBetweenPlanets([(planet1, planet2)])[0]
+
+    def distsBetweenOrbiters(self, pairs):
+        return self.distsBetweenPlanets([(self.planet(orbiter1)['inOrbitOf'], self.planet(orbiter2)['inOrbitOf'])
+                                         for orbiter1, orbiter2 in pairs])
+
+    def distsBetweenPlanets(self, pairs):
+        if not self.index:
+            self.index = PlanetaryIndex(self)
+        return self.index.dists(pairs)
 
     def pathBetweenPlanets(self, planet1, planet2):
         path1 = self.pathToCOM(self.planet(planet1))
         path2 = self.pathToCOM(self.planet(planet2))
-        commonPath = list(filter(lambda p:p in path2, path1))
+        path2Set = set(path2)
+        commonPath = list(filter(lambda p: p in path2Set, path1))
         path1to2 = path1[0:path1.index(commonPath[0])]
         path2.reverse()
         path1to2.extend(path2[path2.index(commonPath[0]):])
@@ -371,20 +2147,87 @@ class PlanetarySystem(object):
         return pathToCOM
 
     def pathToCOM(self, planet):
+        pathToCOM = []
         planet = self.planet(planet)
-        if not planet:
-            return ['COM']
-        pathToCOM = [planet['name']]
-        pathToCOM.extend(self.pathToCOM(planet['inOrbitOf']))
+        while planet:
+            pathToCOM.append(planet['name'])
+            planet = self.planet(planet['inOrbitOf'])
+        pathToCOM.append('COM')
         return pathToCOM
 
     def pprint(self):
         return pprint.PrettyPrinter(indent=2).pprint(self.planets)
 
+class PlanetaryIndex(object):
+    # binary lifting over planets numbered in BFS order, 0 is COM (and any other unknown name);
+    # later planets get the next free number, arrays grow by doubling
+    numbers = None
+    depths = None
+    ancestors = None
+    size = 0
+
+    def __init__(self, system):
+        names = [name for name, planet in system.planets.items() if planet['inOrbitOf'] not in system.planets]
+        for name in names:
+            names.extend(system.orbiters.get(name, ()))
+        self.numbers = dict((name, i+1) for i, name in enumerate(names))
+        self.size = len(names) + 1
+        parents = np.zeros(len(names)+1, dtype=np.int64)
+        self.depths = np.zeros(len(names)+1, dtype=np.int64)
+        for name, i in self.numbers.items():
+            planet = system.planets[name]
+            parents[i] = self.numbers.get(planet['inOrbitOf'], 0)
+            self.depths[i] = planet['toCOM']
+        self.ancestors = [parents]
+        for k in range(1, max(1, int(self.depths.max()).bit_length())):
+            self.ancestors.append(self.ancestors[-1][self.ancestors[-1]])
+
+    def update(self, system, names):
+        # names in BFS order: a parent's ancestors are up to date before its orbiters are
+        for name in names:
+            i = self.numbers.get(name, None) or self.number(name)
+            planet = system.planets[name]
+            self.depths[i] = planet['toCOM']
+            self.ancestors[0][i] = self.numbers.get(planet['inOrbitOf'], 0)
+            for k in range(1, len(self.ancestors)):
+                self.ancestors[k][i] = self.ancestors[k-1][self.ancestors[k-1][i]]
+            while planet['toCOM'] >> len(self.ancestors):
+                self.ancestors.append(self.ancestors[-1][self.ancestors[-1]])
+
+    def number(self, name):
+        if self.size == len(self.depths):
+            self.depths = np.concatenate([self.depths, np.zeros(self.size, dtype=np.int64)])
+            self.ancestors = [np.concatenate([up, np.zeros(self.size, dtype=np.int64)]) for up in self.ancestors]
+        self.numbers[name] = self.size
+        self.size += 1
+        return self.numbers[name]
+
+    def remove(self, name):
+        self.numbers.pop(name, None)
+
+    def lca(self, a, b):
+        swap = self.depths[a] < self.depths[b]
+        a, b = np.where(swap, b, a), np.where(swap, a, b)
+        diff = self.depths[a] - self.depths[b]
+        for k, up in enumerate(self.ancestors):
+            a = np.where((diff >> k) & 1, up[a], a)
+        for up in reversed(self.ancestors):
+            upA, upB = up[a], up[b]
+            differ = upA != upB
+            a, b = np.where(differ, upA, a), np.where(differ, upB, b)
+        return np.where(a == b, a, self.ancestors[0][a])
+
+    def dists(self, pairs):
+        a = np.array([self.numbers.get(planet1, 0) for planet1, planet2 in pairs], dtype=np.int64)
+        b = np.array([self.numbers.get(planet2, 0) for planet1, planet2 in pairs], dtype=np.int64)
+        return (self.depths[a] + self.depths[b] - 2 * self.depths[self.lca(a, b)]).tolist()
+
+
 # FIRE CLASS ##################################################################
 class Puzzles(object):
     # --------------------------------------------- day 1
     def puzzle1_1(self,
+                  massesFile='input-data/input-day1-modules-masses.txt',
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
 
@@ -400,11 +2243,16 @@ class Puzzles(object):
         # logging.info("approach 2: %s" % totalFuel)
 
         # approach 3
-        totalFuel = sum(map(calcFuelForModuleMass, modulesMasses()))
-        logging.debug("approach 3: %s" % totalFuel)
+        # totalFuel = sum(map(calcFuelForModuleMass, modulesMasses()))
+        # logging.debug("approach 3: %s" % totalFuel)
+
+        # approach 4 - bulk
+        totalFuel = sum(map(calcFuelForMasses, modulesMassesChunks(massesFile)))
+        logging.debug("approach 4: %s", totalFuel)
         return totalFuel
 
     def puzzle1_2(self,
+                  massesFile='input-data/input-day1-modules-masses.txt',
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
 
@@ -425,8 +2273,12 @@ class Puzzles(object):
         # logging.info("approach 2: %s" % (totalFuel))
 
         # approach 2
-        totalFuel = sum(map(calcFuelForModuleAndFuel, modulesMasses()))
-        logging.debug("approach 3: %s" % totalFuel)
+        # totalFuel = sum(map(calcFuelForModuleAndFuel, modulesMasses()))
+        # logging.debug("approach 3: %s" % totalFuel)
+
+        # approach 4 - bulk
+        totalFuel = sum(map(calcFuelForMassesAndFuel, modulesMassesChunks(massesFile)))
+        logging.debug("approach 4: %s", totalFuel)
         return totalFuel
 
     # --------------------------------------------- day 2
@@ -434,71 +2286,92 @@ class Puzzles(object):
                   programFile='input-data/input-day2-intcode-program.txt',
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
-        computer = IntcodeComputer(programFile=programFile)
+        computer = IntcodeComputer(programFile=programFile, tracer=IntcodeTracer() if verbose else None)
         result = computer.runProgram(noun, verb)
+        if verbose:
+            computer.tracer.report()
         return result
 
     def puzzle2_2(self, result,
                   programFile='input-data/input-day2-intcode-program.txt',
+                  workers=1, smart=False, lockstep=False,
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
-        computer = IntcodeComputer(programFile=programFile)
-        result = computer.findInput(result)
+        computer = IntcodeComputer(programFile=programFile, tracer=IntcodeTracer() if verbose else None)
+        result = computer.findInput(result, workers=workers, smart=smart, lockstep=lockstep)
+        if verbose:
+            computer.tracer.report()
         return result
 
     # --------------------------------------------- day 3
     def puzzle3_1(self, descFile='input-data/input-day3-wires-test1.txt',
-                  draw=False,
+                  draw=False, engine='segments', drawFile=None, drawScale=1, viewport=None,
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
-        wirebox = WireBox(descFile=descFile)
+        wirebox = wireBoxEngines[engine](descFile=descFile)
         wirebox.construct()
-        if draw:
-            wirebox.drawBox()
+        if draw or drawFile:
+            wirebox.drawBox(viewport=viewport, scale=drawScale, output=drawFile)
         result = wirebox.distanceToClosestCrossing()
         return result
 
     def puzzle3_2(self, descFile='input-data/input-day3-wires-test1.txt',
-                  draw=False,
+                  draw=False, engine='segments', drawFile=None, drawScale=1, viewport=None,
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
-        wirebox = WireBox(descFile=descFile)
+        wirebox = wireBoxEngines[engine](descFile=descFile)
         wirebox.construct()
-        if draw:
-            wirebox.drawBox()
+        if draw or drawFile:
+            wirebox.drawBox(viewport=viewport, scale=drawScale, output=drawFile)
         result = wirebox.minStepsToCrossing()
         return result
 
     # --------------------------------------------- day 4
     def puzzle4_1(self, start=231832, end=767346,
+                  workers=None,
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
         breaker = PasswordBreaker(start=start, end=end)
-        result = len(list(breaker.passwords1()))
+        if workers:
+            return breaker.scanCount(rules=breaker.rules1, workers=workers)
+        result = breaker.countPasswords1()
         return result
 
     def puzzle4_2(self, start=231832, end=767346,
+                  workers=None,
                   env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
         breaker = PasswordBreaker(start=start, end=end)
-        result = len(list(breaker.passwords2()))
+        if workers:
+            return breaker.scanCount(rules=breaker.rules2, workers=workers)
+        result = breaker.countPasswords2()
         return result
 
     # --------------------------------------------- day 5
     def puzzle5_1(self, input,
                   programFile='input-data/input-day5-intcode-program.txt',
-                  env='gojira-prod', verbose=False):
+                  env='gojira-prod', verbose=False, profile=None, sample=None):
         initLogging(debug=verbose)
-        computer = IntcodeComputer(programFile=programFile)
+        computer = IntcodeComputer(programFile=programFile, tracer=IntcodeTracer() if verbose else None,
+                                   profiler=IntcodeProfiler(interval=sample) if profile else None)
         result = computer.runTestProgram(system_id=input)
+        if verbose:
+            computer.tracer.report()
+        if profile:
+            computer.profiler.save(profile, program=computer.program)
         return result
 
     def puzzle5_2(self, input,
                   programFile='input-data/input-day5-intcode-program.txt',
-                  env='gojira-prod', verbose=False):
+                  env='gojira-prod', verbose=False, profile=None, sample=None):
         initLogging(debug=verbose)
-        computer = IntcodeComputer(programFile=programFile)
+        computer = IntcodeComputer(programFile=programFile, tracer=IntcodeTracer() if verbose else None,
+                                   profiler=IntcodeProfiler(interval=sample) if profile else None)
         result = computer.runTestProgram(system_id=input)
+        if verbose:
+            computer.tracer.report()
+        if profile:
+            computer.profiler.save(profile, program=computer.program)
         return result
 
     # --------------------------------------------- day 6
@@ -516,12 +2389,44 @@ class Puzzles(object):
         system = PlanetarySystem(orbitsFile)
         return system.distBetweenOrbiters('YOU', 'SAN')
 
+    # --------------------------------------------- many invocations in one process
+    def batch(self, commandsFile='-',
+              env='gojira-prod', verbose=False):
+        # one invocation per line, e.g. "puzzle2_1 12 2" or "puzzle5_2 5 --programFile=...",
+        # answers are printed one per line as they come
+        initLogging(debug=verbose)
+        lines = sys.stdin if commandsFile == '-' else open(commandsFile)
+        for line in lines:
+            if line.strip() and not line.lstrip().startswith('#'):
+                print(self.dispatch(line))
+
+    def dispatch(self, line):
+        name, *tokens = shlex.split(line)
+        if not name.startswith('puzzle'):
+            raise ValueError("not a puzzle: %s" % name)
+        args, kwargs = [], {}
+        for token in tokens:
+            if token.startswith('--'):
+                key, separator, value = token[2:].partition('=')
+                kwargs[key] = parseArgument(value) if separator else True
+            else:
+                args.append(parseArgument(token))
+        return getattr(self, name)(*args, **kwargs)
+
     # --------------------------------------------- tests only
     def test(self,
              env='gojira-prod', verbose=False):
         initLogging(debug=verbose)
 
 
+def parseArgument(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
 ###############################################################################
 if __name__ == '__main__':
+    import fire
     fire.Fire(Puzzles)
@@ -0,0 +1,162 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import json
+import fire
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from puzzles import Puzzles, IntcodeComputer, wireBoxEngines, PlanetarySystem, PasswordBreaker
+from puzzles import inputCache
+
+
+# SYNTHETIC INPUTS ############################################################
+# counts down from the input value, outputs the sum of all counter values
+INTCODE_LOOP = [3, 100, 1, 100, 101, 101, 1001, 100, -1, 100, 1005, 100, 2, 4, 101, 99]
+
+
+def writeIntcodeLoop(path):
+    program = INTCODE_LOOP + [0] * (102 - len(INTCODE_LOOP))
+    with open(path, 'w') as file:
+        file.write(','.join(map(str, program)) + '\n')
+
+
+def writeWires(path, segments, wires=2, maxLength=1000, seed=3):
+    rnd = random.Random(seed)
+    with open(path, 'w') as file:
+        for wire in range(0, wires):
+            # alternate axes so consecutive moves never fold back onto each other
+            moves = [rnd.choice('RL' if i % 2 == 0 else 'UD') + str(rnd.randint(1, maxLength)) for i in range(0, segments)]
+            file.write(','.join(moves) + '\n')
+
+
+def writeOrbits(path, bodies, branching=3, seed=6):
+    rnd = random.Random(seed)
+    lines = ['COM)P0']
+    for i in range(1, bodies):
+        parent = (i - 1) // branching if branching else rnd.randrange(0, i)
+        lines.append('P%s)P%s' % (parent, i))
+    lines.append('P%s)YOU' % rnd.randrange(0, bodies))
+    lines.append('P%s)SAN' % rnd.randrange(0, bodies))
+    rnd.shuffle(lines)
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def writeMasses(path, lines, seed=1):
+    rnd = random.Random(seed)
+    with open(path, 'w') as file:
+        for i in range(0, lines):
+            file.write('%s\n' % rnd.randint(50000, 150000))
+
+
+# HARNESS #####################################################################
+def measure(function, items, repeat=3):
+    best = None
+    for i in range(0, repeat):
+        inputCache.clear()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    inputCache.clear()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'items': items, 'throughput': items / best if best else None, 'peakBytes': peak}
+
+
+def benchmarks(directory, scale=1, workers=2):
+    # name -> (function, items processed per call)
+    loopFile = os.path.join(directory, 'intcode-loop.txt')
+    wiresFile = os.path.join(directory, 'wires.txt')
+    orbitsFile = os.path.join(directory, 'orbits.txt')
+    deepOrbitsFile = os.path.join(directory, 'orbits-deep.txt')
+    massesFile = os.path.join(directory, 'masses.txt')
+    loops, segments, bodies, masses = 20000 * scale, 300 * scale, 50000 * scale, 100000 * scale
+    writeIntcodeLoop(loopFile)
+    writeWires(wiresFile, segments=segments)
+    writeOrbits(orbitsFile, bodies=bodies)
+    writeOrbits(deepOrbitsFile, bodies=bodies, branching=0)
+    writeMasses(massesFile, lines=masses)
+
+    def wires(engine, part):
+        def run():
+            wirebox = wireBoxEngines[engine](descFile=wiresFile)
+            wirebox.construct()
+            return wirebox.distanceToClosestCrossing() if part == 1 else wirebox.minStepsToCrossing()
+        return run
+
+    def intcodeLoop(engine, memory='list'):
+        return lambda: IntcodeComputer(programFile=loopFile, engine=engine, memory=memory).runTestProgram(loops)
+
+    pairs = [('P%s' % i, 'P%s' % (i * 7 % bodies)) for i in range(0, bodies // 5)]
+    runs = {
+        'puzzle1_1': (lambda: Puzzles().puzzle1_1(massesFile=massesFile), masses),
+        'puzzle1_2': (lambda: Puzzles().puzzle1_2(massesFile=massesFile), masses),
+        'puzzle2_1': (lambda: Puzzles().puzzle2_1(12, 2), 1),
+        'puzzle2_2': (lambda: Puzzles().puzzle2_2(19690720), 5937),
+        'puzzle2_2.workers': (lambda: Puzzles().puzzle2_2(19690720, workers=workers), 5937),
+        'puzzle2_2.smart': (lambda: Puzzles().puzzle2_2(19690720, smart=True), 5937),
+        'puzzle3_1.segments': (wires('segments', 1), 2 * segments),
+        'puzzle3_2.segments': (wires('segments', 2), 2 * segments),
+        'puzzle3_2.numpy': (wires('numpy', 2), 2 * segments),
+        'puzzle4_1': (lambda: Puzzles().puzzle4_1(start=0, end=10 ** (6 * scale)), 10 ** (6 * scale)),
+        'puzzle4_2': (lambda: Puzzles().puzzle4_2(start=0, end=10 ** (6 * scale)), 10 ** (6 * scale)),
+        'puzzle4_2.workers': (lambda: Puzzles().puzzle4_2(start=100000, end=100000 + 2 * masses, workers=workers), 2 * masses),
+        'puzzle5_1': (lambda: Puzzles().puzzle5_1(1), 1),
+        'puzzle5_2': (lambda: Puzzles().puzzle5_2(5), 1),
+        'puzzle5_2.loop': (lambda: Puzzles().puzzle5_2(loops, programFile=loopFile), 3 * loops),
+        'puzzle6_1': (lambda: Puzzles().puzzle6_1(orbitsFile=orbitsFile), bodies),
+        'puzzle6_1.deep': (lambda: Puzzles().puzzle6_1(orbitsFile=deepOrbitsFile), bodies),
+        'puzzle6_2': (lambda: Puzzles().puzzle6_2(orbitsFile=orbitsFile), bodies),
+        'IntcodeComputer.decoded': (intcodeLoop('decoded'), 3 * loops),
+        'IntcodeComputer.classic': (intcodeLoop('classic'), 3 * loops),
+        'IntcodeComputer.compact': (intcodeLoop('decoded', memory='compact'), 3 * loops),
+        'PasswordBreaker.scan': (lambda: PasswordBreaker(start=100000, end=100000 + masses).scanCount(), masses),
+        'PlanetarySystem.dists': (lambda: PlanetarySystem(orbitsFile).distsBetweenPlanets(pairs), len(pairs)),
+    }
+    if scale <= 1:
+        runs['WireBox.grid'] = (wires('grid', 2), 2 * segments)
+    return runs
+
+
+def compare(results, baseline, tolerance=0.25):
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get(name, None)
+        if previous and result['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions[name] = {'seconds': result['seconds'], 'baselineSeconds': previous['seconds'],
+                                 'ratio': result['seconds'] / previous['seconds']}
+    return regressions
+
+
+# FIRE CLASS ##################################################################
+class Bench(object):
+    def run(self, scale=1, workers=2, repeat=3, only=None, output=None, baseline=None, tolerance=0.25):
+        with tempfile.TemporaryDirectory() as directory:
+            results = {}
+            for name, (function, items) in benchmarks(directory, scale=scale, workers=workers).items():
+                if only and not name.startswith(only):
+                    continue
+                results[name] = measure(function, items, repeat=repeat)
+        report = {'scale': scale, 'results': results}
+        if baseline:
+            with open(baseline) as file:
+                report['regressions'] = compare(results, json.load(file)['results'], tolerance)
+        if output:
+            with open(output, 'w') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+        print(json.dumps(report, indent=2, sort_keys=True))
+        if report.get('regressions', None):
+            sys.exit(1)
+
+
+###############################################################################
+if __name__ == '__main__':
+    fire.Fire(Bench)
@@ -0,0 +1,27 @@
+import json
+import pytest
+
+from puzzles import IntcodeComputer
+from puzzles_bench import Bench, compare, writeIntcodeLoop
+
+
+class TestBench(object):
+    def test_intcode_loop(self, tmp_path):
+        writeIntcodeLoop(str(tmp_path / 'loop.txt'))
+        assert 55 == IntcodeComputer(str(tmp_path / 'loop.txt')).runTestProgram(10)
+
+    def test_run_and_compare(self, tmp_path):
+        Bench().run(repeat=1, only='puzzle1', output=str(tmp_path / 'baseline.json'))
+        report = json.load(open(str(tmp_path / 'baseline.json')))
+        assert ['puzzle1_1', 'puzzle1_2'] == sorted(report['results'])
+        assert 100000 == report['results']['puzzle1_1']['items']
+        assert report['results']['puzzle1_1']['peakBytes'] > 0
+        Bench().run(repeat=1, only='puzzle1', baseline=str(tmp_path / 'baseline.json'), tolerance=100)
+
+    def test_compare(self, tmp_path):
+        baseline = {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}}
+        results = {'a': {'seconds': 1.1}, 'b': {'seconds': 2.0}, 'c': {'seconds': 5.0}}
+        assert ['b'] == list(compare(results, baseline, tolerance=0.25))
+        (tmp_path / 'baseline.json').write_text(json.dumps({'results': {'puzzle1_1': {'seconds': 0.0000001}}}))
+        with pytest.raises(SystemExit):
+            Bench().run(repeat=1, only='puzzle1_1', baseline=str(tmp_path / 'baseline.json'))